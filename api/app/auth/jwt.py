@@ -1,6 +1,9 @@
+import time
 from datetime import datetime, timedelta
+from threading import Lock
 from typing import Optional
 
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -12,6 +15,32 @@ from ..user.models import User
 # Define OAuth2 password bearer scheme - Update to match the router endpoint
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# Users already resolved from a token, so bursts of requests with the same token
+# skip the JWT decoding and the database lookup. Entries hold detached User
+# objects and live for 5 seconds at most (or until the token expires).
+# The cache is per process: with several workers a user change is only
+# invalidated in the worker that handled it, the others may serve the old
+# copy for up to USER_CACHE_TTL seconds
+USER_CACHE_TTL = 5
+user_cache = TTLCache(maxsize=4096, ttl=USER_CACHE_TTL)
+user_cache_lock = Lock()
+
+
+def invalidate_cached_user(user_id: int):
+    """
+    Drop every cached token that resolves to the given user.
+    
+    Must be called whenever a user's data changes. It only clears this
+    process' cache, other workers keep their copy until it expires.
+    
+    Args:
+        user_id: ID of the user to drop from the cache
+    """
+    with user_cache_lock:
+        tokens = [token for token, (user, _) in user_cache.items() if user.id == user_id]
+        for token in tokens:
+            user_cache.pop(token, None)
+
 # Function to create access token
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
@@ -59,6 +88,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # Serve the user from the cache if this token was already verified
+    with user_cache_lock:
+        cached = user_cache.get(token)
+    if cached is not None and cached[1] > time.time():
+        # Attach a copy to this request's session without querying the database
+        return db.merge(cached[0], load=False)
+    
     try:
         # Decode the JWT token
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
@@ -72,8 +108,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         user = db.query(User).filter(User.email == email).first()
         if user is None:
             raise credentials_exception
+        
+        # Cache a detached copy, the request gets its own session bound instance
+        # so commits on this session can't expire the cached one
+        db.expunge(user)
+        with user_cache_lock:
+            user_cache[token] = (user, payload.get("exp", 0))
             
-        return user
+        return db.merge(user, load=False)
         
     except JWTError:
         raise credentials_exception 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 import numpy as np
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import func
@@ -18,32 +18,25 @@ router = APIRouter(
 )
 
 
-@router.post("/submit", response_model=dict)
-async def submit_feedback(
-    feedback: schema.FeedbackCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def build_feedback(feedback: schema.FeedbackCreate, user_id: int) -> Feedback:
     """
-    Submit feedback on a prediction.
+    Build a Feedback entry from a validated feedback payload.
     
     Parameters
     ----------
     feedback : schema.FeedbackCreate
         Feedback data.
-    db : Session
-        Database session.
-    current_user : User
-        Current authenticated user.
+    user_id : int
+        ID of the user who provided the feedback.
         
     Returns
     -------
-    dict
-        Confirmation message and feedback ID.
+    Feedback
+        The feedback entry, any type other than fare_duration is stored as demand.
     """
     if feedback.prediction_type == "fare_duration":
-        db_feedback = Feedback(
-            user_id=current_user.id,
+        return Feedback(
+            user_id=user_id,
             prediction_type=PredictionType.FARE_DURATION,
             predicted_fare=feedback.predicted_fare,
             predicted_duration=feedback.predicted_duration,
@@ -53,8 +46,8 @@ async def submit_feedback(
             comment=feedback.comment
         )
     else:  # demand
-        db_feedback = Feedback(
-            user_id=current_user.id,
+        return Feedback(
+            user_id=user_id,
             prediction_type=PredictionType.DEMAND,
             predicted_demand=feedback.predicted_demand,
             region_id=feedback.region_id,
@@ -62,6 +55,32 @@ async def submit_feedback(
             rating=feedback.rating,
             comment=feedback.comment
         )
+
+
+@router.post("/submit", response_model=dict)
+async def submit_feedback(
+    feedback: schema.FeedbackCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Submit feedback on a prediction.
+    
+    Parameters
+    ----------
+    feedback : schema.FeedbackCreate
+        Feedback data.
+    db : Session
+        Database session.
+    current_user : User
+        Current authenticated user.
+        
+    Returns
+    -------
+    dict
+        Confirmation message and feedback ID.
+    """
+    db_feedback = build_feedback(feedback, current_user.id)
     
     db.add(db_feedback)
     db.commit()
@@ -73,28 +92,21 @@ async def submit_feedback(
     }
 
 
-@router.post("", response_model=dict)
-async def handle_ui_feedback(
-    feedback_data: dict,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def build_ui_feedback(feedback_data: dict, user_id: int) -> Optional[Feedback]:
     """
-    Handle feedback from the UI.
+    Build a Feedback entry from the feedback payload sent by the UI.
     
     Parameters
     ----------
     feedback_data : dict
         Contains rating, optional comment, and prediction details
-    db : Session
-        Database session.
-    current_user : User
-        Current authenticated user.
+    user_id : int
+        ID of the user who provided the feedback.
         
     Returns
     -------
-    dict
-        Confirmation message.
+    Feedback or None
+        The feedback entry, or None if the prediction type is unknown.
     """
     rating = feedback_data.get("rating", 3)
     comment = feedback_data.get("comment", "")
@@ -112,8 +124,8 @@ async def handle_ui_feedback(
         predicted_duration = last_prediction.get("trip_duration", 0.0)
         
         # Create a feedback entry
-        db_feedback = Feedback(
-            user_id=current_user.id,
+        return Feedback(
+            user_id=user_id,
             prediction_type=PredictionType.FARE_DURATION,
             predicted_fare=predicted_fare,
             predicted_duration=predicted_duration,
@@ -122,15 +134,6 @@ async def handle_ui_feedback(
             rating=rating,
             comment=comment
         )
-        
-        db.add(db_feedback)
-        db.commit()
-        db.refresh(db_feedback)
-        
-        return {
-            "message": "Feedback submitted successfully",
-            "feedback_id": db_feedback.id
-        }
     
     elif prediction_type == "demand":
         # Extract values from the prediction data
@@ -141,8 +144,8 @@ async def handle_ui_feedback(
         predicted_demand = last_prediction.get("demand", 0)
         
         # Create a feedback entry
-        db_feedback = Feedback(
-            user_id=current_user.id,
+        return Feedback(
+            user_id=user_id,
             prediction_type=PredictionType.DEMAND,
             predicted_demand=predicted_demand,
             region_id=region_id,
@@ -150,20 +153,97 @@ async def handle_ui_feedback(
             rating=rating,
             comment=comment
         )
+    
+    return None
+
+
+@router.post("", response_model=dict)
+async def handle_ui_feedback(
+    feedback_data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Handle feedback from the UI.
+    
+    Parameters
+    ----------
+    feedback_data : dict
+        Contains rating, optional comment, and prediction details
+    db : Session
+        Database session.
+    current_user : User
+        Current authenticated user.
         
-        db.add(db_feedback)
-        db.commit()
-        db.refresh(db_feedback)
-        
+    Returns
+    -------
+    dict
+        Confirmation message.
+    """
+    db_feedback = build_ui_feedback(feedback_data, current_user.id)
+    
+    # Handle unknown prediction types
+    if db_feedback is None:
         return {
-            "message": "Feedback submitted successfully",
-            "feedback_id": db_feedback.id
+            "message": "Feedback received but not stored in database - unknown prediction type",
+            "feedback_type": feedback_data.get("prediction_type", "")
         }
     
-    # Handle unknown prediction types
+    db.add(db_feedback)
+    db.commit()
+    db.refresh(db_feedback)
+    
+    return {
+        "message": "Feedback submitted successfully",
+        "feedback_id": db_feedback.id
+    }
+
+
+@router.post("/batch", response_model=dict)
+async def handle_ui_feedback_batch(
+    batch: schema.FeedbackBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Handle several feedback entries from the UI in a single request.
+    
+    Every entry is validated before anything reaches the database, so a
+    malformed one rejects the request with a 422. All entries are stored in
+    one transaction. Entries with an unknown prediction type are skipped,
+    same as in handle_ui_feedback.
+    
+    Parameters
+    ----------
+    batch : schema.FeedbackBatch
+        List of feedback payloads, each in the format accepted by submit_feedback.
+    db : Session
+        Database session.
+    current_user : User
+        Current authenticated user.
+        
+    Returns
+    -------
+    dict
+        Confirmation message and the IDs of the stored feedback.
+    """
+    entries = [
+        build_feedback(item, current_user.id)
+        for item in batch.items
+        if item.prediction_type in ("fare_duration", "demand")
+    ]
+    
+    # Read the IDs after the flush, the commit expires the entries and reading
+    # them afterwards would refresh each one with its own SELECT
+    db.add_all(entries)
+    db.flush()
+    feedback_ids = [entry.id for entry in entries]
+    db.commit()
+    
     return {
-        "message": "Feedback received but not stored in database - unknown prediction type",
-        "feedback_type": prediction_type
+        "message": "Feedback submitted successfully",
+        "feedback_ids": feedback_ids,
+        "skipped": len(batch.items) - len(entries)
     }
 
 
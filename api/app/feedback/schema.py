@@ -118,4 +118,16 @@ class FeedbackStats(BaseModel):
         Average rating.
     """
     feedback_count: int
-    avg_rating: float 
\ No newline at end of file
+    avg_rating: float
+
+
+class FeedbackBatch(BaseModel):
+    """
+    Schema for a batch of feedback sent by the UI.
+    
+    Attributes
+    ----------
+    items : List[FeedbackCreate]
+        Feedback payloads, each in the format of a single submission.
+    """
+    items: List[FeedbackCreate] = Field(..., max_items=100)
\ No newline at end of file
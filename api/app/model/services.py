@@ -1,9 +1,10 @@
+import asyncio
 import json
-import time
 from uuid import uuid4
 import logging
 
 import redis
+from starlette.concurrency import run_in_threadpool
 
 from app import settings
 
@@ -50,7 +51,9 @@ async def predict_fare_duration(data):
     logger.info(f"Input data: {data}")
 
     # Send the job to the model service using Redis lpush to the fare_duration queue
-    db.lpush(settings.FARE_DURATION_QUEUE, json.dumps(job_data))
+    # The redis client is blocking, so its calls run in the threadpool to keep
+    # the event loop free for other requests
+    await run_in_threadpool(db.lpush, settings.FARE_DURATION_QUEUE, json.dumps(job_data))
 
     # Loop until we receive response, with timeout to prevent infinite wait
     max_retries = 100  # Add a maximum retry count for safety
@@ -58,7 +61,7 @@ async def predict_fare_duration(data):
     
     while retry_count < max_retries:
         # Attempt to get model predictions using job_id as the key
-        output = db.get(job_id)
+        output = await run_in_threadpool(db.get, job_id)
 
         # Check if prediction is ready
         if output is not None:
@@ -75,13 +78,14 @@ async def predict_fare_duration(data):
             logger.info(f"Fare: ${fare_amount:.2f}, Duration: {trip_duration:.2f} seconds ({trip_duration/60:.1f} minutes)")
 
             # Clean up by deleting the job from Redis
-            db.delete(job_id)
+            await run_in_threadpool(db.delete, job_id)
             
             # Return the prediction values
             return fare_amount, trip_duration
 
-        # Sleep some time waiting for model results
-        time.sleep(settings.API_SLEEP)
+        # Sleep some time waiting for model results, without blocking the
+        # event loop so other requests are served while the model runs
+        await asyncio.sleep(settings.API_SLEEP)
         retry_count += 1
 
     # If we reach here, prediction timed out
@@ -114,7 +118,9 @@ async def predict_demand(data):
     }
 
     # Send the job to the model service using Redis lpush to the demand queue
-    db.lpush(settings.DEMAND_QUEUE, json.dumps(job_data))
+    # The redis client is blocking, so its calls run in the threadpool to keep
+    # the event loop free for other requests
+    await run_in_threadpool(db.lpush, settings.DEMAND_QUEUE, json.dumps(job_data))
 
     # Loop until we receive response, with timeout to prevent infinite wait
     max_retries = 100  # Add a maximum retry count for safety
@@ -122,7 +128,7 @@ async def predict_demand(data):
     
     while retry_count < max_retries:
         # Attempt to get model predictions using job_id as the key
-        output = db.get(job_id)
+        output = await run_in_threadpool(db.get, job_id)
 
         # Check if prediction is ready
         if output is not None:
@@ -133,13 +139,14 @@ async def predict_demand(data):
             demand = output["demand"]
 
             # Clean up by deleting the job from Redis
-            db.delete(job_id)
+            await run_in_threadpool(db.delete, job_id)
             
             # Return the prediction values
             return demand
 
-        # Sleep some time waiting for model results
-        time.sleep(settings.API_SLEEP)
+        # Sleep some time waiting for model results, without blocking the
+        # event loop so other requests are served while the model runs
+        await asyncio.sleep(settings.API_SLEEP)
         retry_count += 1
 
     # If we reach here, prediction timed out
@@ -2,7 +2,7 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.auth.jwt import get_current_user
+from app.auth.jwt import get_current_user, invalidate_cached_user
 from app.db import get_db
 from app.user import schema
 from app.user.models import User
@@ -126,4 +126,7 @@ def update_current_user(
     db.commit()
     db.refresh(current_user)
     
+    # The user may be cached under its tokens, drop the stale copies
+    invalidate_cached_user(current_user.id)
+    
     return current_user 
\ No newline at end of file
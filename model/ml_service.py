@@ -17,7 +17,6 @@ input features such as trip distance, passenger count, and temporal features.
 
 import json
 import os
-import time
 import pickle
 import sys
 from pathlib import Path
@@ -28,6 +27,7 @@ import numpy as np
 import pandas as pd
 import redis
 import settings
+from numba import njit
 
 # Connect to Redis
 db = redis.Redis(
@@ -43,6 +43,19 @@ duration_model = None
 demand_model = None
 onehot_encoder = None
 scaler = None
+scaler_min = None
+scaler_range = None
+
+
+@njit(cache=True)
+def mmscale(x, mn, rng):
+    """
+    MinMax scale a float32 feature vector with the fitted scaler parameters.
+
+    Equivalent to MinMaxScaler.transform for the default (0, 1) feature range,
+    but compiled so a single request does not pay sklearn's input validation.
+    """
+    return (x - mn) / rng
 
 # Load ML models 
 try:
@@ -103,6 +116,20 @@ except Exception:
     onehot_encoder = None
     scaler = None
 
+# Extract the MinMaxScaler parameters for the compiled kernel, if this fails
+# predictions fall back to scaler.transform
+if scaler is not None:
+    try:
+        scaler_min = scaler.data_min_.astype(np.float32)
+        scaler_range = (scaler.data_max_ - scaler.data_min_).astype(np.float32)
+        # constant features are left unscaled, same as sklearn does
+        scaler_range[scaler_range == 0.0] = 1.0
+        # warm up numba so the first real request doesn't pay the JIT cost
+        mmscale(np.zeros_like(scaler_min), scaler_min, scaler_range)
+    except Exception:
+        scaler_min = None
+        scaler_range = None
+
 def extract_time_features(datetime_str):
     """
     Extract time-related features from a datetime string for regression model input.
@@ -156,6 +183,157 @@ def extract_time_features(datetime_str):
         'time_of_day': time_of_day
     }
 
+def build_fare_duration_features(data):
+    """
+    Builds the processed feature row used by the fare and duration models.
+    
+    Parameters
+    ----------
+    data : dict
+        Dictionary with input features, same as for predict_fare_duration.
+    
+    Returns
+    -------
+    tuple
+        (processed_features, time_features, trip_distance, passenger_count) where
+        processed_features is a 2D array with a single row.
+    """
+    # Extract input features
+    passenger_count = data.get('passenger_count', 1)  # Default to 1 passenger if not provided
+    trip_distance = data.get('trip_distance', 1.0)  # Default to 1 mile if not provided
+    pickup_datetime = data.get('pickup_datetime', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    
+    # Extract time features
+    time_features = extract_time_features(pickup_datetime)
+    
+    # Create features dictionary and convert to DataFrame with the correct order
+    features = {
+        'passenger_count': [float(passenger_count)],
+        'trip_distance': [float(trip_distance)],
+        'time_of_day': [time_features['time_of_day']],
+        'day': [float(time_features['day'])],
+        'month': [float(time_features['month'])],
+        'is_weekend': [float(time_features['is_weekend'])]
+    }
+    
+    # Convert to DataFrame
+    features_df = pd.DataFrame(features)
+    
+    # Preprocess the features
+    if onehot_encoder is not None and scaler is not None:
+        try:
+            # Transform time_of_day using OneHotEncoder
+            td_data = onehot_encoder.transform(features_df[['time_of_day']])
+            
+            # Transform other data with the compiled MinMax kernel when it was
+            # set up, with the scaler itself otherwise
+            if scaler_min is not None:
+                raw_features = features_df.drop(columns=['time_of_day']).values[0].astype(np.float32)
+                other_data = mmscale(raw_features, scaler_min, scaler_range).reshape(1, -1)
+            else:
+                cols_to_scale = ['passenger_count', 'trip_distance', 'day', 'month', 'is_weekend']
+                other_data = scaler.transform(features_df[cols_to_scale])
+            
+            # Concatenate the data
+            processed_features = np.concatenate((other_data, td_data), axis=1)
+        except Exception:
+            try:
+                # Following the approach from test_direct_model.py
+                # Transform time_of_day using OneHotEncoder
+                td_data = onehot_encoder.transform(features_df[['time_of_day']])
+                # Transform other data using MinMaxScaler
+                cols_to_scale = ['passenger_count', 'trip_distance', 'day', 'month', 'is_weekend']
+                other_data = scaler.transform(features_df[cols_to_scale])
+                # Concatenate the data
+                processed_features = np.concatenate((other_data, td_data), axis=1)
+            except Exception:
+                # Fall back to direct features for prediction
+                processed_features = features_df.drop(columns=['time_of_day']).values
+    else:
+        # Create a fallback feature matrix
+        processed_features = features_df.drop(columns=['time_of_day']).values
+    
+    return processed_features, time_features, float(trip_distance), float(passenger_count)
+
+def batch_model_predict(model, batch):
+    """
+    Runs a single predict call over a stacked batch of feature rows.
+    
+    Returns
+    -------
+    np.ndarray or None
+        One prediction per row, or None if the model is missing or failed.
+    """
+    if model is None:
+        return None
+    try:
+        # Use the sklearn predict method directly on the XGBRegressor object
+        return np.asarray(model.predict(batch), dtype=float)
+    except Exception:
+        return None
+
+def predict_fare_duration_batch(data_list):
+    """
+    Predicts fare amount and trip duration for a batch of taxi rides.
+    
+    Feature rows are stacked so each regression model is called once for the
+    whole batch instead of once per ride.
+    
+    Parameters
+    ----------
+    data_list : list of dict
+        Input dictionaries, each in the format accepted by predict_fare_duration.
+    
+    Returns
+    -------
+    list of dict
+        One prediction dictionary per input, in the same order.
+    """
+    # Fallback predictions for inputs whose features could not be built
+    results = [{"fare_amount": 15.0, "trip_duration": 1200.0} for _ in data_list]
+    
+    # Build the feature rows, grouping them by width since the rows that fell back
+    # to the raw features can't be stacked with the preprocessed ones
+    groups = {}
+    for idx, data in enumerate(data_list):
+        try:
+            processed_features, time_features, trip_distance, passenger_count = build_fare_duration_features(data)
+        except Exception:
+            continue
+        groups.setdefault(processed_features.shape[1], []).append(
+            (idx, processed_features, time_features, trip_distance, passenger_count)
+        )
+    
+    for rows in groups.values():
+        batch = np.concatenate([row[1] for row in rows], axis=0)
+        fare_preds = batch_model_predict(fare_model, batch)
+        duration_preds = batch_model_predict(duration_model, batch)
+        
+        for pos, (idx, _, time_features, trip_distance, passenger_count) in enumerate(rows):
+            if fare_preds is not None:
+                fare_pred = float(fare_preds[pos])
+            else:
+                # Mock prediction if model is not available
+                fare_pred = 15.0 + (2.5 * trip_distance) + (0.5 * passenger_count)
+                if time_features['is_weekend'] == 1:
+                    fare_pred *= 1.2
+            
+            if duration_preds is not None:
+                duration_pred = float(duration_preds[pos])
+            else:
+                # Mock prediction if model is not available
+                duration_pred = 300.0 + (180.0 * trip_distance)
+                if time_features['is_weekend'] == 1:
+                    duration_pred *= 0.85  # Less traffic on weekends
+            
+            # Ensure predictions are valid numbers
+            results[idx] = {
+                "fare_amount": fare_pred if not np.isnan(fare_pred) else 15.0,
+                "trip_duration": duration_pred if not np.isnan(duration_pred) else 1200.0
+            }
+    
+    return results
+
 def predict_fare_duration(data):
     """
     Predicts fare amount and trip duration for a taxi ride based on input features.
@@ -175,113 +353,7 @@ def predict_fare_duration(data):
         - fare_amount: float (predicted fare in dollars)
         - trip_duration: float (predicted duration in seconds)
     """
-    try:
-        # Extract input features
-        passenger_count = data.get('passenger_count', 1)  # Default to 1 passenger if not provided
-        trip_distance = data.get('trip_distance', 1.0)  # Default to 1 mile if not provided
-        pickup_datetime = data.get('pickup_datetime', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        
-        # Extract time features
-        time_features = extract_time_features(pickup_datetime)
-        
-        # Create features dictionary and convert to DataFrame with the correct order
-        features = {
-            'passenger_count': [float(passenger_count)],
-            'trip_distance': [float(trip_distance)],
-            'time_of_day': [time_features['time_of_day']],
-            'day': [float(time_features['day'])],
-            'month': [float(time_features['month'])],
-            'is_weekend': [float(time_features['is_weekend'])]
-        }
-        
-        # Convert to DataFrame
-        features_df = pd.DataFrame(features)
-        
-        # Preprocess the features
-        if onehot_encoder is not None and scaler is not None:
-            try:
-                # Transform time_of_day using OneHotEncoder
-                td_data = onehot_encoder.transform(features_df[['time_of_day']])
-                
-                # Transform other data using MinMaxScaler
-                other_data = scaler.transform(features_df.drop(columns=['time_of_day']))
-                
-                # Concatenate the data
-                processed_features = np.concatenate((other_data, td_data), axis=1)
-            except Exception:
-                try:
-                    # Following the approach from test_direct_model.py
-                    # Transform time_of_day using OneHotEncoder
-                    td_data = onehot_encoder.transform(features_df[['time_of_day']])
-                    # Transform other data using MinMaxScaler
-                    cols_to_scale = ['passenger_count', 'trip_distance', 'day', 'month', 'is_weekend']
-                    other_data = scaler.transform(features_df[cols_to_scale])
-                    # Concatenate the data
-                    processed_features = np.concatenate((other_data, td_data), axis=1)
-                except Exception:
-                    # Fall back to direct features for prediction
-                    processed_features = features_df.drop(columns=['time_of_day']).values
-        else:
-            # Create a fallback feature matrix
-            processed_features = features_df.drop(columns=['time_of_day']).values
-        
-        # Make predictions if models are available
-        if fare_model is not None:
-            try:
-                # Use the sklearn predict method directly on the XGBRegressor object
-                fare_pred = float(fare_model.predict(processed_features)[0])
-            except Exception:
-                try:
-                    # Try a different approach for prediction
-                    fare_pred = float(fare_model.predict(processed_features)[0])
-                except Exception:
-                    # Fall back to mock prediction only if all else fails
-                    fare_pred = 15.0 + (2.5 * trip_distance) + (0.5 * passenger_count)
-                    if time_features['is_weekend'] == 1:
-                        fare_pred *= 1.2
-        else:
-            # Mock prediction if model is not available
-            fare_pred = 15.0 + (2.5 * trip_distance) + (0.5 * passenger_count)
-            if time_features['is_weekend'] == 1:
-                fare_pred *= 1.2
-        
-        if duration_model is not None:
-            try:
-                # Use the sklearn predict method directly on the XGBRegressor object
-                duration_pred = float(duration_model.predict(processed_features)[0])
-            except Exception:
-                try:
-                    # Try a different approach for prediction
-                    duration_pred = float(duration_model.predict(processed_features)[0])
-                except Exception:
-                    # Fall back to mock prediction only if all else fails
-                    duration_pred = 300.0 + (180.0 * trip_distance)
-                    if time_features['is_weekend'] == 1:
-                        duration_pred *= 0.85  # Less traffic on weekends
-        else:
-            # Mock prediction if model is not available
-            duration_pred = 300.0 + (180.0 * trip_distance)
-            if time_features['is_weekend'] == 1:
-                duration_pred *= 0.85  # Less traffic on weekends
-        
-        # Ensure predictions are valid numbers
-        fare_pred = float(fare_pred) if not np.isnan(fare_pred) else 15.0
-        duration_pred = float(duration_pred) if not np.isnan(duration_pred) else 1200.0
-        
-        # Return predictions
-        result = {
-            "fare_amount": fare_pred,
-            "trip_duration": duration_pred
-        }
-        return result
-    
-    except Exception:
-        # Return fallback predictions
-        result = {
-            "fare_amount": 15.0,
-            "trip_duration": 1200.0
-        }
-        return result
+    return predict_fare_duration_batch([data])[0]
 
 def predict_demand(data):
     """
@@ -390,42 +462,53 @@ def prediction_process():
         #   4. Store the results on Redis using the original job ID as the key
 
         try:
-            # Try to get a fare/duration prediction job first
-            fare_duration_job = db.brpop(
-                settings.FARE_DURATION_QUEUE,
+            # Block until a job arrives on either queue, fare/duration jobs are
+            # served first since that queue is listed first. The timeout only
+            # keeps the loop alive, there is no need to sleep between jobs.
+            # The API lpushes jobs and we pop from the same end, so the queues
+            # are LIFO: under a backlog the newest requests (the ones whose
+            # callers are still waiting) finish first, at the cost of FIFO
+            # fairness for the oldest ones, which are closest to timing out anyway
+            job = db.blpop(
+                [settings.FARE_DURATION_QUEUE, settings.DEMAND_QUEUE],
                 timeout=1
             )
             
-            if fare_duration_job:
-                _, job_data = fare_duration_job
-                
-                # Decode the JSON data
-                job_dict = json.loads(job_data.decode('utf-8'))
-                
-                # Get the original job ID
-                job_id = job_dict['id']
+            if job is None:
+                continue
+            
+            queue_name, job_data = job
+            
+            if queue_name.decode('utf-8') == settings.FARE_DURATION_QUEUE:
+                jobs = [job_data]
                 
-                # Get the input data
-                input_data = job_dict['data']
+                # Drain the jobs already waiting in the queue so they are
+                # predicted together, in a single round trip to Redis
+                if settings.BATCH_SIZE > 1:
+                    pipe = db.pipeline()
+                    for _ in range(settings.BATCH_SIZE - 1):
+                        pipe.lpop(settings.FARE_DURATION_QUEUE)
+                    jobs.extend(queued for queued in pipe.execute() if queued is not None)
                 
-                # Run the model prediction
-                result = predict_fare_duration(input_data)
+                # Decode the JSON data, skipping malformed jobs so they
+                # don't take down the rest of the batch
+                job_dicts = []
+                for raw_job in jobs:
+                    try:
+                        job_dict = json.loads(raw_job.decode('utf-8'))
+                        job_dicts.append({'id': job_dict['id'], 'data': job_dict['data']})
+                    except Exception:
+                        continue
                 
-                # Prepare and store results
-                db.set(job_id, json.dumps(result))
-                
-                # Continue to next iteration
-                continue
-                
-            # Try to get a demand prediction job
-            demand_job = db.brpop(
-                settings.DEMAND_QUEUE,
-                timeout=1
-            )
-            
-            if demand_job:
-                _, job_data = demand_job
+                # Run the model prediction once for the whole batch
+                results = predict_fare_duration_batch([job_dict['data'] for job_dict in job_dicts])
                 
+                # Store the results using the original job IDs
+                pipe = db.pipeline()
+                for job_dict, result in zip(job_dicts, results):
+                    pipe.set(job_dict['id'], json.dumps(result))
+                pipe.execute()
+            else:
                 # Decode the JSON data
                 job_dict = json.loads(job_data.decode('utf-8'))
                 
@@ -443,9 +526,6 @@ def prediction_process():
         except Exception:
             pass
 
-        # Sleep for a bit if no jobs
-        time.sleep(settings.SERVER_SLEEP)
-
 def test_models():
     """
     Test the loaded regression models with sample data to ensure they are working properly.
@@ -4,7 +4,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Model service settings
-SERVER_SLEEP = float(os.getenv("SERVER_SLEEP", 0.05))
+# Maximum number of fare/duration jobs predicted together
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 16))
 
 # Redis settings
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
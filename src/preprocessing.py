@@ -29,21 +29,20 @@ def preprocess_data(
     print("Input val data shape: ", val_df.shape)
     print("Input test data shape: ", test_df.shape, "\n")
 
-    # making a copy of the dataframe to do changes
-    working_train_df = train_df.copy()
-    working_val_df = val_df.copy()
-    working_test_df = test_df.copy()
-
     # 1
     # we only have one categorical feature in our cleaned data set which is time_of_day
     # and it has 3 categories, so we can use OneHotEncoder for this task
 
-    one_hot_enc = OneHotEncoder(handle_unknown='ignore',sparse=False)
+    # the encoder outputs float32 so the concatenated matrices stay float32 end-to-end,
+    # float64 would only double the memory traffic of every later step
+    one_hot_enc = OneHotEncoder(handle_unknown='ignore',sparse=False,dtype=np.float32)
     # first fit and transform training data
-    train_data = one_hot_enc.fit_transform(working_train_df[['time_of_day']])
+    # the inputs are only read from here on (drop returns a new frame), so we
+    # avoid copying the full train/val/test dataframes
+    train_data = one_hot_enc.fit_transform(train_df.loc[:, ['time_of_day']])
     #transform the others
-    val_data = one_hot_enc.transform(working_val_df[['time_of_day']])
-    test_data = one_hot_enc.transform(working_test_df[['time_of_day']])
+    val_data = one_hot_enc.transform(val_df.loc[:, ['time_of_day']])
+    test_data = one_hot_enc.transform(test_df.loc[:, ['time_of_day']])
 
     # upload the trained OneHotEncoder to the model/models folder
     # it will be needed to preprocess the inputs when the model is used to make predictions
@@ -64,11 +63,12 @@ def preprocess_data(
     # 2
     # since we do not expect to have any null values in our dataset (its supposed to have been
     # previously cleaned), then we can just proceed to apply MinMax scaling to all of the columns
+    # MinMaxScaler keeps float32 inputs as float32
     scaler = MinMaxScaler()
 
-    train_scaled = scaler.fit_transform(working_train_df.drop(columns=['time_of_day']))
-    val_scaled = scaler.transform(working_val_df.drop(columns=['time_of_day']))
-    test_scaled = scaler.transform(working_test_df.drop(columns=['time_of_day']))
+    train_scaled = scaler.fit_transform(train_df.drop(columns=['time_of_day']).astype(np.float32))
+    val_scaled = scaler.transform(val_df.drop(columns=['time_of_day']).astype(np.float32))
+    test_scaled = scaler.transform(test_df.drop(columns=['time_of_day']).astype(np.float32))
 
     # upload the trained OneHotEncoder to the model/models folder
     # it will be needed to preprocess the inputs when the model is used to make predictions
@@ -94,8 +94,39 @@ def preprocess_data(
     print("Output val data shape: ", val.shape)
     print("Output test data shape: ", test.shape)
 
+    # 3
+    # persist the processed sets as parquet so training runs can reload them
+    # (or just the columns they need) without going through preprocessing again
+    columns = list(train_df.columns.drop('time_of_day')) + \
+        list(one_hot_enc.get_feature_names_out(['time_of_day']))
+    save_folder = str(Path(__file__).parent.parent / "data/processed")
+    os.makedirs(save_folder, exist_ok=True)
+    for name, data in (('train', train), ('val', val), ('test', test)):
+        save_path = os.path.join(save_folder, f"{name}.parquet")
+        pd.DataFrame(data, columns=columns).to_parquet(
+            save_path, engine='pyarrow', compression='zstd', row_group_size=200_000
+        )
+
     return train, val, test
 
+def load_processed_data(name: str, columns: list = None) -> pd.DataFrame:
+    """
+    Loads one of the processed sets saved by preprocess_data.
+
+    Arguments:
+        name : str
+            Which set to load, one of 'train', 'val' or 'test'
+        columns : list
+            Optional subset of features to read, only those columns are loaded from disk
+    Returns:
+        df : pd.DataFrame
+            Processed features for the requested set
+    """
+    save_folder = str(Path(__file__).parent.parent / "data/processed")
+    save_path = os.path.join(save_folder, f"{name}.parquet")
+
+    return pd.read_parquet(save_path, engine='pyarrow', columns=columns)
+
 def preprocess_input_data(inpu_data:pd.DataFrame) -> np.ndarray:
     """
     Pre processes the data for a specific input using the already trained MinMax scaler and OneHot encoder.
@@ -129,6 +160,6 @@ def preprocess_input_data(inpu_data:pd.DataFrame) -> np.ndarray:
 
     # now we trasnform the data and concatenate and return it at the end
     td_data = one_hot_encoder.transform(working_df[['time_of_day']])
-    other_data = scaler.transform(working_df.drop(columns=['time_of_day']))
+    other_data = scaler.transform(working_df.drop(columns=['time_of_day']).astype(np.float32))
 
     return np.concatenate((other_data,td_data), axis=1)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import logging
+import queue
+import threading
+import time
+
+import orjson
+import requests
+import streamlit as st
+from app.session import SESSION, auth_headers, timed
+from app.settings import API_BASE_URL, API_TIMEOUT, FEEDBACK_BATCH_SIZE, FEEDBACK_MAX_WAIT
+
+FEEDBACK_BATCH_URL = f"{API_BASE_URL}/feedback/batch"
+
+logger = logging.getLogger(__name__)
+
+
+@timed
+def post_feedback_batch(token: str, items: list) -> None:
+    """Sends a batch of feedback from one user to the batch feedback endpoint.
+
+    Runs in the flush thread, so failures are logged instead of shown.
+
+    Args:
+        token (str): token to authenticate the user
+        items (list): feedback payloads of the user
+    """
+    try:
+        response = SESSION.post(
+            FEEDBACK_BATCH_URL,
+            headers=auth_headers(token),
+            data=orjson.dumps({"items": items}),
+            timeout=API_TIMEOUT,
+            allow_redirects=False
+        )
+    except requests.RequestException as e:
+        logger.error("Dropped %d feedback items, sending failed: %s", len(items), e)
+        return
+    
+    if response.status_code not in (200, 201):
+        logger.error(
+            "Dropped %d feedback items, API error: %s - %s",
+            len(items), response.status_code, response.text[:512]
+        )
+
+
+def flush_feedback(feedback_queue: queue.Queue) -> None:
+    """Drains the feedback queue forever, posting one batch per user.
+
+    A batch is sent once it holds FEEDBACK_BATCH_SIZE items or FEEDBACK_MAX_WAIT
+    seconds after its first item arrived, whichever comes first.
+
+    Args:
+        feedback_queue (queue.Queue): queue of (token, feedback_data) items
+    """
+    while True:
+        batch = [feedback_queue.get()]
+        deadline = time.monotonic() + FEEDBACK_MAX_WAIT
+        while len(batch) < FEEDBACK_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(feedback_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        # Items from different users need their own token
+        by_token = {}
+        for token, feedback_data in batch:
+            by_token.setdefault(token, []).append(feedback_data)
+        for token, items in by_token.items():
+            # Any error would end this thread and every later batch with it
+            try:
+                post_feedback_batch(token, items)
+            except Exception:
+                logger.exception("Dropped %d feedback items, unexpected error", len(items))
+
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_queue() -> queue.Queue:
+    """Creates the feedback queue shared by every session and starts its
+    flush thread.
+
+    Returns:
+        queue.Queue: queue of (token, feedback_data) items to send
+    """
+    feedback_queue = queue.Queue()
+    threading.Thread(target=flush_feedback, args=(feedback_queue,), daemon=True).start()
+    return feedback_queue
@@ -0,0 +1,294 @@
+import threading
+
+import numpy as np
+import orjson
+import requests
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from app.session import SESSION, submit_in_background, timed
+from app.settings import API_TIMEOUT, DEBUG, GOOGLE_MAPS_API_KEY
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+ROUTES_URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
+# Only the fields read below are returned by the Routes API
+ROUTES_FIELD_MASK = ",".join([
+    "routes.polyline.encodedPolyline",
+    "routes.legs.distanceMeters",
+    "routes.legs.duration",
+    "routes.legs.startLocation",
+    "routes.legs.endLocation",
+])
+EARTH_RADIUS_KM = 6371.0
+
+# Addresses users type most often, including the form's placeholder examples
+WARM_LANDMARKS = [
+    "Times Square, New York",
+    "Central Park, New York",
+    "JFK Airport, New York",
+    "LaGuardia Airport, New York",
+    "Grand Central Terminal, New York",
+    "Penn Station, New York",
+    "Empire State Building, New York",
+    "Wall Street, New York",
+    "Brooklyn Bridge, New York",
+    "Madison Square Garden, New York",
+]
+
+
+@st.cache_data(ttl=86400, max_entries=1024, show_spinner=False)
+@timed
+def fetch_geocode(address: str, api_key: str) -> tuple:
+    """Calls the Google Geocoding API for an already normalized address.
+
+    Results are cached for a day since popular addresses repeat a lot.
+    Failures raise so they are not cached and can be retried.
+
+    Args:
+        address (str): normalized address to geocode
+        api_key (str): Google Maps API key
+
+    Returns:
+        tuple: (lat, lng) of the address
+    """
+    response = SESSION.get(GEOCODE_URL, params={"address": address, "key": api_key}, timeout=API_TIMEOUT)
+    if response.status_code != 200:
+        raise LookupError(response.status_code)
+    result = orjson.loads(response.content)
+    if result["status"] != "OK":
+        raise LookupError(result["status"])
+    location = result["results"][0]["geometry"]["location"]
+    return location["lat"], location["lng"]
+
+
+def geocode_address(address, api_key):
+    # Normalize the address so different spellings of the same text share the cache
+    normalized = " ".join(address.lower().split())
+    try:
+        return fetch_geocode(normalized, api_key)
+    except LookupError:
+        return None, None
+
+
+@st.cache_resource(show_spinner=False)
+def warm_geocode_cache(api_key: str) -> threading.Thread:
+    """Geocodes WARM_LANDMARKS in the background once per server process.
+
+    The lookups fill the fetch_geocode cache, so the first user to pick a
+    common landmark doesn't wait for Google. They run one at a time in their
+    own daemon thread rather than in the shared pool, so the first user's own
+    requests don't queue behind them. Nothing waits on the results.
+
+    Args:
+        api_key (str): Google Maps API key
+
+    Returns:
+        threading.Thread: thread running the lookups
+    """
+    def warm():
+        for address in WARM_LANDMARKS:
+            try:
+                geocode_address(address, api_key)
+            except (requests.RequestException, ValueError):
+                continue
+    
+    thread = threading.Thread(target=warm, daemon=True)
+    # Attach the script run context so the lookups fill the same st cache
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+    return thread
+
+
+def decode_polyline(encoded: str) -> np.ndarray:
+    """Decodes a Google encoded polyline into (lat, lng) points.
+
+    Every character carries 5 bits of a number and has 0x20 set unless it
+    ends the number. The whole string is decoded with array operations:
+    the chunks are shifted into place, summed per number, unzigzagged, and
+    the (lat, lng) deltas are accumulated.
+
+    Args:
+        encoded (str): encoded polyline from the Routes API
+
+    Returns:
+        np.ndarray: (n, 2) array of (lat, lng) points of the route
+    """
+    if not encoded:
+        return np.empty((0, 2), dtype=np.float64)
+    
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    ends = (chunks & 0x20) == 0
+    starts = np.concatenate(([0], np.flatnonzero(ends)[:-1] + 1))
+    number = np.concatenate(([0], np.cumsum(ends[:-1])))
+    shifts = 5 * (np.arange(chunks.size) - starts[number])
+    values = np.add.reduceat((chunks & 0x1f) << shifts, starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 1e5
+
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+@timed
+def fetch_directions(lat1: float, lng1: float, lat2: float, lng2: float, api_key: str) -> dict:
+    """Calls the Google Routes API for a driving route between two points.
+
+    Coordinates should be rounded by the caller so small jitter still hits
+    the cache. Failures raise so they are not cached. Only the fields used by
+    the page are requested through the field mask, and the polyline is
+    decoded here, so cached entries stay small and repeated routes skip the
+    decoding too.
+
+    Args:
+        lat1 (float): origin latitude
+        lng1 (float): origin longitude
+        lat2 (float): destination latitude
+        lng2 (float): destination longitude
+        api_key (str): Google Maps API key
+
+    Returns:
+        dict: decoded points, total distance (m) and duration (s), and the
+        start and end coordinates of the first route
+    """
+    body = {
+        "origin": {"location": {"latLng": {"latitude": lat1, "longitude": lng1}}},
+        "destination": {"location": {"latLng": {"latitude": lat2, "longitude": lng2}}},
+        "travelMode": "DRIVE"
+    }
+    headers = {
+        "Content-Type": "application/json",
+        "X-Goog-Api-Key": api_key,
+        "X-Goog-FieldMask": ROUTES_FIELD_MASK
+    }
+    response = SESSION.post(ROUTES_URL, headers=headers, data=orjson.dumps(body), timeout=API_TIMEOUT)
+    # Error bodies are not always JSON (e.g. from a proxy), only the status is used
+    if response.status_code != 200:
+        raise LookupError(response.status_code)
+    data = orjson.loads(response.content)
+    if not data.get("routes"):
+        raise LookupError("ZERO_RESULTS")
+    route = data["routes"][0]
+    
+    # Calculate total distance and duration, zero values are omitted from the
+    # response and durations come as strings like "754s"
+    legs = route["legs"]
+    distancia_total_m = sum(leg.get("distanceMeters", 0) for leg in legs)  # meters
+    duracion_total_s = sum(int(float(leg.get("duration", "0s").rstrip("s"))) for leg in legs)  # seconds
+    
+    start = legs[0]["startLocation"]["latLng"]
+    end = legs[-1]["endLocation"]["latLng"]
+    return {
+        "points": decode_polyline(route["polyline"]["encodedPolyline"]),
+        "distance_m": distancia_total_m,
+        "duration_s": duracion_total_s,
+        "start": [start["latitude"], start["longitude"]],
+        "end": [end["latitude"], end["longitude"]],
+    }
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometers.
+
+    Works on scalars or NumPy arrays of coordinates.
+
+    Args:
+        lat1: origin latitude(s)
+        lng1: origin longitude(s)
+        lat2: destination latitude(s)
+        lng2: destination longitude(s)
+
+    Returns:
+        distance(s) in kilometers
+    """
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def calculate_route(origin: str, destination: str, use_directions: bool = True) -> bool:
+    """Geocodes both addresses, gets the route between them and stores it in
+    the session state for the map and the prediction.
+
+    Without use_directions the Routes API is skipped and the straight-line
+    distance between the two addresses is used instead.
+
+    Args:
+        origin (str): origin address
+        destination (str): destination address
+        use_directions (bool): follow the street network with the Routes API
+
+    Returns:
+        bool: True if the route was calculated
+    """
+    if not origin or not destination:
+        st.error("Please enter both origin and destination addresses.")
+        return False
+
+    # Get coordinates, both lookups are independent so they run concurrently
+    # in the shared thread pool
+    origin_future = submit_in_background(geocode_address, origin, GOOGLE_MAPS_API_KEY)
+    destination_future = submit_in_background(geocode_address, destination, GOOGLE_MAPS_API_KEY)
+    try:
+        lat1, lng1 = origin_future.result()
+        lat2, lng2 = destination_future.result()
+    except (requests.RequestException, ValueError) as e:
+        st.error(f"Could not reach the geocoding service: {e}")
+        return False
+
+    if lat1 is None or lat2 is None:
+        st.error("Could not geocode one or both addresses. Please check them and try again.")
+        return False
+
+    if not use_directions:
+        distancia_km = round(float(haversine_km(lat1, lng1, lat2, lng2)), 2)
+        
+        st.session_state.has_route = True
+        st.session_state.pop("route_map_html", None)
+        st.session_state.route_distance_km = distancia_km
+        st.session_state.route_distance_miles = round(distancia_km * 0.621371, 2)
+        st.session_state.route_origin = origin
+        st.session_state.route_destination = destination
+        st.session_state.route_points = np.array([[lat1, lng1], [lat2, lng2]], dtype=np.float64)
+        st.session_state.route_origin_coords = [lat1, lng1]
+        st.session_state.route_destination_coords = [lat2, lng2]
+        st.session_state.route_duration_text = "not available for straight-line distance"
+        return True
+
+    # Call Google Maps Routes API, rounding to ~1m so repeated
+    # routes are served from the cache
+    try:
+        route = fetch_directions(
+            round(lat1, 5), round(lng1, 5), round(lat2, 5), round(lng2, 5), GOOGLE_MAPS_API_KEY
+        )
+    except (LookupError, requests.RequestException, ValueError) as e:
+        st.error(f"Could not calculate route: {e}")
+        return False
+
+    # Convert to readable format
+    distancia_km = round(route["distance_m"] / 1000, 2)
+    distancia_miles = round(distancia_km * 0.621371, 2)
+
+    # Save to session state
+    st.session_state.has_route = True
+    st.session_state.pop("route_map_html", None)
+    st.session_state.route_distance_km = distancia_km
+    st.session_state.route_distance_miles = distancia_miles
+    st.session_state.route_origin = origin
+    st.session_state.route_destination = destination
+    # Stored as an array so reruns don't convert the points again
+    st.session_state.route_points = np.asarray(route["points"], dtype=np.float64)
+    st.session_state.route_origin_coords = route["start"]
+    st.session_state.route_destination_coords = route["end"]
+
+    # Calculate human-readable duration
+    horas, resto = divmod(route["duration_s"], 3600)
+    minutos = resto // 60
+    st.session_state.route_duration_text = f"{horas}h {minutos}min" if horas > 0 else f"{minutos}min"
+
+    # Print debug info
+    if DEBUG:
+        print(f"\n==== ROUTE CALCULATED AND STORED ====")
+        print(f"Origin: {origin} -> Destination: {destination}")
+        print(f"Distance: {distancia_km} km / {distancia_miles} miles")
+        print(f"Session state vars: {list(st.session_state.keys())}")
+
+    return True
@@ -0,0 +1,104 @@
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
+
+
+@st.cache_resource(show_spinner=False)
+def get_session() -> requests.Session:
+    """Creates the HTTP session shared by every call to the API and to Google Maps.
+
+    Streamlit reruns the whole script on each interaction, caching the session
+    keeps its pooled keep-alive connections alive between reruns instead of
+    opening a new connection (and TLS handshake) per request.
+
+    Returns:
+        requests.Session: session with a connection pool mounted for http and https
+    """
+    session = requests.Session()
+    session.headers.update({
+        "accept": "application/json",
+        "User-Agent": "nyc-taxi-prediction-ui"
+    })
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = get_session()
+
+
+@functools.lru_cache(maxsize=256)
+def auth_headers(token: str) -> dict:
+    """Headers for an authenticated JSON request to the API, built once per token.
+
+    The session is shared by every user, so the token can't be set on it.
+    API responses are small, so they are requested uncompressed; Google Maps
+    calls keep the session's default gzip encoding. The returned dict is
+    shared between calls and must not be modified.
+    """
+    return {
+        "Content-Type": "application/json",
+        "Accept-Encoding": "identity",
+        "Authorization": f"Bearer {token}"
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor() -> ThreadPoolExecutor:
+    """Creates the thread pool used to overlap API calls with page rendering."""
+    return ThreadPoolExecutor(max_workers=8)
+
+
+def submit_in_background(fn, *args) -> Future:
+    """Runs fn in the shared thread pool while the script keeps rendering.
+
+    The script run context is attached to the worker thread so st caches used
+    inside fn behave as in the main thread. fn must not display anything:
+    the page is still being rendered by the script thread, and Streamlit's
+    element cursor is not thread safe. Return or raise, and let the script
+    thread display the outcome.
+
+    Returns:
+        Future: future holding the result of fn
+    """
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    
+    return get_executor().submit(run)
+
+
+# Latest (function, milliseconds) timings of outgoing HTTP calls, shared by
+# every session. Appending to a deque is thread safe, so calls made from
+# worker threads are recorded too.
+LATENCIES = deque(maxlen=200)
+
+
+def timed(fn):
+    """Records the wall time of each call to fn in LATENCIES.
+
+    Applied under st.cache_data so only calls that reach the network are timed.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            LATENCIES.append((fn.__name__, (time.perf_counter_ns() - start) / 1e6))
+    return wrapper
@@ -4,8 +4,12 @@ import os
 API_HOST = os.getenv("API_HOST", "localhost")
 API_PORT = os.getenv("API_PORT", "8000")
 API_BASE_URL = f"http://{API_HOST}:{API_PORT}"
+API_TIMEOUT = (3, 15)  # (connect, read) timeouts in seconds
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", 16))
+FEEDBACK_MAX_WAIT = float(os.getenv("FEEDBACK_MAX_WAIT", 1.0))  # seconds
 
 # UI settings
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
 PAGE_TITLE = "NYC Taxi Prediction"
 PAGE_ICON = "🚕"
 
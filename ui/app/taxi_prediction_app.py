@@ -1,69 +1,219 @@
+import base64
 import datetime
-from typing import Optional
+import hashlib
+import string
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
 
 import folium
 import pandas as pd
 import requests
 import streamlit as st
-from app.settings import API_BASE_URL, DEFAULT_MAP_LOCATION, DEFAULT_ZOOM, PAGE_ICON, PAGE_TITLE, GOOGLE_MAPS_API_KEY
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+from app.feedback import get_feedback_queue
+from app.session import LATENCIES, SESSION, auth_headers, submit_in_background, timed
+from app.settings import API_BASE_URL, API_TIMEOUT, DEFAULT_MAP_LOCATION, DEFAULT_ZOOM, PAGE_ICON, PAGE_TITLE, GOOGLE_MAPS_API_KEY
 from streamlit_js_eval import streamlit_js_eval
-import polyline
+import orjson
 import json
 
 
-def login(username: str, password: str) -> Optional[str]:
-    """This function calls the login endpoint of the API to authenticate the user
-    and get a token.
+# Endpoints and static headers are built once instead of on every call
+LOGIN_URL = f"{API_BASE_URL}/auth/token"
+CURRENT_USER_URL = f"{API_BASE_URL}/users/me"
+PREDICT_FARE_DURATION_URL = f"{API_BASE_URL}/model/predict/fare_duration"
+PREDICT_DEMAND_URL = f"{API_BASE_URL}/model/predict/demand"
+
+# localStorage key used to keep the token across browser sessions
+TOKEN_STORAGE_KEY = "taxi_prediction_token"
+
+# The session already sends "accept: application/json". Responses from the
+# API are small JSON bodies, so they are requested uncompressed.
+FORM_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept-Encoding": "identity"
+}
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+@timed
+def request_token(username: str, password: str) -> str:
+    """Requests a new access token from the login endpoint of the API.
+
+    Results are cached for 10 seconds, enough for repeated logins with the
+    same credentials (e.g. a double click before the rerun) to skip the API,
+    and short enough that a cached token is never close to its expiration.
+    Streamlit keys the cache on a hash of the arguments. Failed logins raise,
+    so they are never cached.
 
     Args:
         username (str): email of the user
         password (str): password of the user
 
     Returns:
-        Optional[str]: token if login is successful, None otherwise
+        str: access token
     """
-    # TODO: Implement the login function
-    # 1. Construct the API endpoint URL
-    # 2. Set up the request headers
-    # 3. Prepare the data payload
-    # 4. Send the API request
-    # 5. Check if the response is successful
-    # 6. Extract the token from the response
-    # 7. Return the token if successful, None otherwise
-    
-    url = f"{API_BASE_URL}/auth/token"
-    
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    
     data = {
         "username": username,
         "password": password
     }
     
+    response = SESSION.post(LOGIN_URL, headers=FORM_HEADERS, data=data, timeout=API_TIMEOUT, allow_redirects=False)
+    response.raise_for_status()
+    
+    return orjson.loads(response.content)["access_token"]
+
+
+def login(username: str, password: str) -> Optional[str]:
+    """This function calls the login endpoint of the API to authenticate the user
+    and get a token.
+
+    Args:
+        username (str): email of the user
+        password (str): password of the user
+
+    Returns:
+        Optional[str]: token if login is successful, None otherwise
+    """
     try:
-        response = requests.post(url, headers=headers, data=data)
-        
-        if response.status_code == 200:
-            return response.json().get("access_token")
+        return request_token(username, password)
+    except requests.HTTPError:
+        # Wrong credentials, the caller shows the error message
+        pass
     except Exception as e:
         st.error(f"Login failed: {str(e)}")
     
     return None
 
 
-def predict_fare_duration(token: str, data: dict) -> requests.Response:
+@timed
+def restore_token(token: str) -> bool:
+    """Checks whether a token kept in the browser can still be used.
+
+    The expiration claim is read locally first, so expired tokens never reach
+    the API, then the token is checked against the current user endpoint.
+
+    Args:
+        token (str): token read from the browser storage
+
+    Returns:
+        bool: True if the token is valid
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = orjson.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return False
+    
+    # The payload may be valid JSON without being an object
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return False
+    
+    try:
+        response = SESSION.get(CURRENT_USER_URL, headers=auth_headers(token), timeout=API_TIMEOUT, allow_redirects=False)
+    except requests.RequestException:
+        return False
+    return response.status_code == 200
+
+
+def error_text(response: requests.Response) -> str:
+    """Reads at most the first 512 bytes of an error response for display.
+
+    The rest of a streamed body is never downloaded, and the connection is
+    released right after. The text is kept on the response so it can be
+    displayed more than once.
+
+    Args:
+        response (requests.Response): non successful response from the API
+
+    Returns:
+        str: beginning of the response body
+    """
+    if not hasattr(response, "error_text"):
+        chunk = next(response.iter_content(512), b"")
+        response.close()
+        response.error_text = chunk.decode("utf-8", errors="replace")
+    return response.error_text
+
+
+class UncachedResponse(Exception):
+    """Carries an API response that must not be stored by the prediction cache."""
+
+    def __init__(self, response: requests.Response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+# Errors a prediction request can raise, JSON decoding errors are ValueErrors
+PREDICTION_ERRORS = (UncachedResponse, requests.RequestException, ValueError)
+
+
+def prediction_error(error: Exception) -> str:
+    """Message to display for a failed prediction request.
+
+    Reads the body of API errors, so it must run on the script thread along
+    with the st call that displays it.
+
+    Args:
+        error (Exception): one of PREDICTION_ERRORS
+
+    Returns:
+        str: error message
+    """
+    if isinstance(error, UncachedResponse):
+        return f"API error: {error.response.status_code} - {error_text(error.response)}"
+    return f"Prediction failed: {str(error)}"
+
+
+def hash_token(token: str) -> str:
+    """Short hash of the token, used in cache keys instead of the token itself."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+@st.cache_data(ttl=600, max_entries=2048, show_spinner=False)
+@timed
+def post_prediction(url: str, payload: bytes, token_hash: str, _token: str) -> dict:
+    """Posts a prediction request to the API, caching successful results.
+
+    Identical requests (same route and passengers, same region and hour)
+    within 10 minutes are answered from the cache instead of the backend.
+    Only the parsed body is cached, never the response, whose request
+    carries the token. Non-200 responses raise UncachedResponse so they are
+    never cached.
+
+    Args:
+        url (str): prediction endpoint of the API
+        payload (bytes): JSON body, serialized with sorted keys so equal requests share a key
+        token_hash (str): hash of the token, keys the cache per user
+        _token (str): token to authenticate the user, excluded from the cache key
+
+    Returns:
+        dict: prediction returned by the API
+    """
+    # Streamed so error bodies are never downloaded past what error_text reads
+    response = SESSION.post(
+        url, headers=auth_headers(_token), data=payload, stream=True, timeout=API_TIMEOUT, allow_redirects=False
+    )
+    if response.status_code != 200:
+        raise UncachedResponse(response)
+    
+    return orjson.loads(response.content)
+
+
+def predict_fare_duration(token: str, data: dict) -> dict:
     """This function calls the predict_fare_duration endpoint of the API.
 
+    It runs in worker threads too, so it never calls st itself: failures
+    raise one of PREDICTION_ERRORS for the caller to display.
+
     Args:
         token (str): token to authenticate the user
         data (dict): prediction data including passenger_count and trip_distance
 
     Returns:
-        requests.Response: response from the API
+        dict: prediction from the API
     """
     # Ensure we have the required fields
     if 'passenger_count' not in data:
@@ -72,33 +222,16 @@ def predict_fare_duration(token: str, data: dict) -> requests.Response:
     if 'trip_distance' not in data:
         data['trip_distance'] = 1.0  # Default to 1 mile
     
-    # Get current datetime for the pickup 
+    # Get current datetime for the pickup, the model only uses the hour and
+    # date so seconds are dropped to let repeated requests hit the cache
     if 'pickup_datetime' not in data:
-        from datetime import datetime
-        data['pickup_datetime'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    url = f"{API_BASE_URL}/model/predict/fare_duration"
-    
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
+        now = datetime.datetime.now()
+        data['pickup_datetime'] = f"{now.year:04d}-{now.month:02d}-{now.day:02d} {now.hour:02d}:{now.minute:02d}:00"
     
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        
-        # Show errors if request fails
-        if response.status_code != 200:
-            st.error(f"API error: {response.status_code} - {response.text}")
-        
-        return response
-    except Exception as e:
-        st.error(f"Prediction failed: {str(e)}")
-        return None
+    return post_prediction(PREDICT_FARE_DURATION_URL, orjson.dumps(data, option=orjson.OPT_SORT_KEYS), hash_token(token), token)
 
 
-def predict_demand(token: str, data: dict) -> requests.Response:
+def predict_demand(token: str, data: dict) -> Optional[dict]:
     """This function calls the predict_demand endpoint of the API.
 
     Args:
@@ -106,33 +239,21 @@ def predict_demand(token: str, data: dict) -> requests.Response:
         data (dict): prediction data including region_id and date_hour
 
     Returns:
-        requests.Response: response from the API
+        dict: prediction from the API, None if the request failed
     """
-    # TODO: Implement the predict_demand function
-    # 1. Construct the API endpoint URL
-    # 2. Set up the request headers with the token
-    # 3. Send the API request
-    # 4. Return the response
-    
-    url = f"{API_BASE_URL}/model/predict/demand"
-    
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    
     try:
-        response = requests.post(url, headers=headers, json=data)
-        return response
+        return post_prediction(PREDICT_DEMAND_URL, orjson.dumps(data, option=orjson.OPT_SORT_KEYS), hash_token(token), token)
+    except UncachedResponse as e:
+        st.error(f"Prediction failed: {error_text(e.response)}")
+        return None
     except Exception as e:
         st.error(f"Demand prediction failed: {str(e)}")
         return None
 
 
-def send_feedback(token: str, rating: int, comment: str, prediction_type: str, prediction_data: dict) -> requests.Response:
-    """This function calls the feedback endpoint of the API to send feedback about
-    the prediction.
+def send_feedback(token: str, rating: int, comment: str, prediction_type: str, prediction_data: dict) -> None:
+    """This function queues feedback about the prediction and returns right away.
+    A background thread sends the queued feedback to the API in batches.
 
     Args:
         token (str): token to authenticate the user
@@ -140,52 +261,295 @@ def send_feedback(token: str, rating: int, comment: str, prediction_type: str, p
         comment (str): optional text feedback
         prediction_type (str): "fare_duration" or "demand"
         prediction_data (dict): the original prediction data
-
-    Returns:
-        requests.Response: response from the API
     """
-    url = f"{API_BASE_URL}/feedback"
-    
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    
     # Get the last prediction from session state if available
     last_prediction = st.session_state.get("last_prediction", {})
     
+    # The batch endpoint validates each item in the format of a single submission
     feedback_data = {
         "rating": rating,
         "comment": comment,
-        "prediction_type": prediction_type,
-        "prediction_data": prediction_data,
-        "last_prediction": last_prediction
+        "prediction_type": prediction_type
+    }
+    if prediction_type == "fare_duration":
+        feedback_data.update({
+            "predicted_fare": last_prediction.get("fare_amount"),
+            "predicted_duration": last_prediction.get("trip_duration"),
+            "passenger_count": prediction_data.get("passenger_count"),
+            "trip_distance": prediction_data.get("trip_distance")
+        })
+    else:
+        feedback_data.update({
+            "predicted_demand": last_prediction.get("demand"),
+            "region_id": prediction_data.get("region_id"),
+            "date_hour": prediction_data.get("date_hour")
+        })
+    
+    get_feedback_queue().put((token, feedback_data))
+
+
+@st.cache_resource(show_spinner=False)
+def base_map_html(lat: float, lng: float, zoom: int) -> str:
+    """Renders the empty map shown before a route is calculated.
+
+    The map never changes, so it is built and rendered to HTML once per server
+    process instead of on every rerun. The figure wrapping matches what
+    folium_static does, so the output is the same.
+
+    Args:
+        lat (float): latitude of the map center
+        lng (float): longitude of the map center
+        zoom (int): initial zoom level
+
+    Returns:
+        str: HTML of the rendered map
+    """
+    figure = folium.Figure().add_child(folium.Map(location=[lat, lng], zoom_start=zoom))
+    return figure.render()
+
+
+# Sentinel values rendered into the route map template, each one is swapped
+# for a placeholder token that route_map_html fills in
+ROUTE_MAP_SENTINELS = {
+    "__ORIGIN__": [1.5, 2.5],
+    "__DESTINATION__": [3.5, 4.5],
+    "__BOUNDS__": [[7.5, 8.5], [9.5, 10.5]],
+    "__LINE__": [[12.5, 11.5], [14.5, 13.5]],
+}
+
+
+@st.cache_resource(show_spinner=False)
+def route_map_template() -> str:
+    """Renders the route map once with placeholder tokens for its coordinates.
+
+    Folium renders its Jinja templates on every call, while the map HTML only
+    differs in the markers, the route line and the bounds. Sentinel
+    coordinates are rendered and then replaced by tokens, so each route only
+    costs a few string replacements.
+
+    Returns:
+        str: HTML of the route map with placeholder tokens
+    """
+    route_map = folium.Map(location=DEFAULT_MAP_LOCATION, zoom_start=DEFAULT_ZOOM)
+    folium.Marker(
+        ROUTE_MAP_SENTINELS["__ORIGIN__"],
+        tooltip="Origin",
+        icon=folium.Icon(color="green")
+    ).add_to(route_map)
+    folium.Marker(
+        ROUTE_MAP_SENTINELS["__DESTINATION__"],
+        tooltip="Destination",
+        icon=folium.Icon(color="red")
+    ).add_to(route_map)
+    route_feature = {
+        "type": "Feature",
+        "geometry": {
+            "type": "LineString",
+            "coordinates": ROUTE_MAP_SENTINELS["__LINE__"]
+        }
     }
+    folium.GeoJson(
+        route_feature,
+        style_function=lambda feature: {"color": "blue", "weight": 5, "opacity": 0.8}
+    ).add_to(route_map)
+    route_map.fit_bounds(ROUTE_MAP_SENTINELS["__BOUNDS__"])
+    
+    html = folium.Figure().add_child(route_map).render()
+    for token, sentinel in ROUTE_MAP_SENTINELS.items():
+        # Folium serializes with json.dumps, so the sentinel text is predictable
+        rendered = json.dumps(sentinel)
+        if html.count(rendered) != 1:
+            raise RuntimeError(f"Route map template has no unique {token} sentinel")
+        html = html.replace(rendered, token)
+    return html
+
+
+def route_map_html(origin: list, destination: list, line: list, bounds: list) -> str:
+    """Fills the route map template with the coordinates of a route.
+
+    Args:
+        origin (list): [lat, lng] of the origin marker
+        destination (list): [lat, lng] of the destination marker
+        line (list): [lng, lat] points of the route line, GeoJSON order
+        bounds (list): [[south, west], [north, east]] bounds to fit the view to
+
+    Returns:
+        str: HTML of the route map
+    """
+    values = {
+        "__ORIGIN__": origin,
+        "__DESTINATION__": destination,
+        "__BOUNDS__": bounds,
+        "__LINE__": line,
+    }
+    html = route_map_template()
+    for token, value in values.items():
+        html = html.replace(token, orjson.dumps(value).decode())
+    return html
+
+
+# Static page HTML, built once at import instead of on every rerun
+HEADER_HTML = f"<h1 style='text-align: center; color: #FFDD00;'>{PAGE_TITLE}</h1>"
+FOOTER_HTML = (
+    "<hr style='border:2px solid #FFDD00;'>"
+    "<p style='text-align: center; color: #FFDD00;'>NYC Taxi Prediction System</p>"
+)
+
+# Prediction summary box, only the trip details are filled in per prediction
+PREDICTION_TEMPLATE = string.Template("""
+<div style="padding:15px; border-radius:10px; background-color:#2E4053; color:white; margin:10px 0;">
+    <h3 style="margin-top:0; color:white;">Prediction Results</h3>
+    <p>For your <b>$distance mile</b> trip with <b>$passengers</b> passenger(s):</p>
+</div>
+""")
+
+# Rating descriptions
+RATING_DESCRIPTIONS = {
+    1: "Poor",
+    2: "Fair",
+    3: "Good",
+    4: "Very Good",
+    5: "Excellent"
+}
+
+# Use colors that match the dark theme of prediction results
+RATING_COLORS = {
+    1: "#FF5252",  # red accent
+    2: "#FF9800",  # orange accent
+    3: "#FFEB3B",  # yellow accent
+    4: "#4CAF50",  # green accent
+    5: "#00BCD4"   # blue accent
+}
+
+RATING_TEMPLATE = string.Template("""
+<div style="background-color: #2E4053; padding: 20px; border-radius: 10px; text-align: center; margin: 25px 0; box-shadow: 0 4px 8px rgba(0,0,0,0.3);">
+    <div style="font-size: 18px; margin-bottom: 8px; color: white;">You rated this prediction: <strong style="color: $color;">$rating/5</strong></div>
+    <div style="font-size: 30px; margin: 15px 0; color: $color;">$stars</div>
+    <div style="font-style: italic; margin-top: 8px; color: $color;">$description</div>
+</div>
+""")
+
+# There are only five possible ratings, so every display is rendered up front
+RATING_HTML = {
+    rating: RATING_TEMPLATE.substitute(
+        rating=rating,
+        color=RATING_COLORS[rating],
+        stars="⭐" * rating + "☆" * (5 - rating),
+        description=RATING_DESCRIPTIONS[rating]
+    )
+    for rating in RATING_DESCRIPTIONS
+}
+
+
+def request_route_prediction() -> None:
+    """Callback of the route prediction form.
+
+    Callbacks run before the rerun, so the prediction request can start
+    before the map is built.
+    """
+    st.session_state.route_prediction_requested = True
+
+
+def submit_feedback(token: str) -> None:
+    """Callback of the feedback button.
+
+    Callbacks run before the widgets are built, so the rating can still be
+    reset to its default for the next prediction.
+
+    Args:
+        token (str): token to authenticate the user
+    """
+    send_feedback(
+        token=token,
+        rating=st.session_state.feedback_rating,
+        comment=st.session_state.feedback_comment,
+        prediction_type=st.session_state.last_prediction_type,
+        prediction_data=st.session_state.last_prediction_data
+    )
+    st.session_state.feedback_rating = 3
+    st.session_state.feedback_sent = True
+
+
+def speculative_result(future: Future, speculative_data: dict, token: str, data: dict) -> dict:
+    """Result of a speculative prediction request, with a fresh request in
+    its place if it failed.
+
+    The fresh request is sent with data, so it gets the current pickup time
+    instead of the one of the speculative request. On success the pickup time
+    that was used is copied into data for the feedback.
+
+    Args:
+        future (Future): speculative predict_fare_duration call
+        speculative_data (dict): prediction data the speculative call was given
+        token (str): token to authenticate the user
+        data (dict): prediction data of the predict button
+
+    Returns:
+        dict: prediction from the API
+    """
+    try:
+        result = future.result()
+    except PREDICTION_ERRORS as e:
+        # Release the connection of the failed streamed response
+        if isinstance(e, UncachedResponse):
+            e.response.close()
+        return predict_fare_duration(token, data)
+    data["pickup_datetime"] = speculative_data["pickup_datetime"]
+    return result
+
+
+def show_fare_duration_prediction(fetch: Callable[[], dict], prediction_data: dict) -> None:
+    """Displays the result of a fare and duration prediction and stores it for
+    the feedback section.
+
+    Errors of the request are displayed here, on the script thread, even when
+    the request itself ran in a worker thread.
+
+    Args:
+        fetch (Callable[[], dict]): returns the prediction, e.g. the result method of a future
+        prediction_data (dict): prediction data sent to the API
+    """
+    try:
+        result = fetch()
+    except PREDICTION_ERRORS as e:
+        st.error(prediction_error(e))
+        return
     
     try:
-        response = requests.post(url, headers=headers, json=feedback_data)
-        return response
+        # Extract prediction values
+        fare_amount = float(result.get('fare_amount', 0))
+        trip_duration = float(result.get('trip_duration', 0))
+        
+        # Create prediction summary box with updated background color
+        prediction_html = PREDICTION_TEMPLATE.substitute(
+            distance=prediction_data["trip_distance"],
+            passengers=prediction_data["passenger_count"]
+        )
+        st.markdown(prediction_html, unsafe_allow_html=True)
+        
+        # Display metrics
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("💰 Estimated Fare", f"${fare_amount:.2f}")
+        with col2:
+            st.metric("⏱️ Estimated Duration", f"{trip_duration/60:.1f} min")
+        
+        # Store for feedback
+        st.session_state.last_prediction = {
+            'fare_amount': fare_amount,
+            'trip_duration': trip_duration,
+            'success': True
+        }
+        st.session_state.last_prediction_data = prediction_data
+        st.session_state.last_prediction_type = "fare_duration"
+        
     except Exception as e:
-        st.error(f"Sending feedback failed: {str(e)}")
-        return None
+        st.error(f"Error processing prediction: {str(e)}")
 
-def geocode_address(address, api_key):
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}"
-    response = requests.get(url)
-    result = response.json()
-    if result["status"] == "OK":
-        location = result["results"][0]["geometry"]["location"]
-        return location["lat"], location["lng"]
-    else:
-        return None, None
 
 # User interface
 st.set_page_config(page_title=PAGE_TITLE, page_icon=PAGE_ICON)
-st.markdown(
-    f"<h1 style='text-align: center; color: #FFDD00;'>{PAGE_TITLE}</h1>",
-    unsafe_allow_html=True,
-)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # Sidebar for navigation
 st.sidebar.title("Navigation")
@@ -193,6 +557,21 @@ page = st.sidebar.radio("Go to", ["Fare & Duration Prediction", "Demand Predicti
 
 # Login form
 if "token" not in st.session_state:
+    # Returning users skip the login form while their stored token is valid.
+    # After a logout the stored token is removed instead of being read back.
+    if st.session_state.get("logged_out"):
+        streamlit_js_eval(js_expressions=f"localStorage.removeItem('{TOKEN_STORAGE_KEY}')", key="remove_token")
+    else:
+        stored_token = streamlit_js_eval(js_expressions=f"localStorage.getItem('{TOKEN_STORAGE_KEY}')", key="get_token")
+        if stored_token:
+            if restore_token(stored_token):
+                st.session_state.token = stored_token
+                st.experimental_rerun()
+            # A rejected token is removed, so it isn't checked again on every
+            # rerun of the login page
+            st.session_state.logged_out = True
+            streamlit_js_eval(js_expressions=f"localStorage.removeItem('{TOKEN_STORAGE_KEY}')", key="remove_token")
+    
     st.markdown("## Login")
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
@@ -200,6 +579,7 @@ if "token" not in st.session_state:
         token = login(username, password)
         if token:
             st.session_state.token = token
+            st.session_state.pop("logged_out", None)
             st.success("Login successful!")
             st.experimental_rerun()
         else:
@@ -207,6 +587,7 @@ if "token" not in st.session_state:
 else:
     st.success("You are logged in!")
     token = st.session_state.token
+    streamlit_js_eval(js_expressions=f"localStorage.setItem('{TOKEN_STORAGE_KEY}', '{token}')", key="set_token")
 
     if page == "Fare & Duration Prediction":
                 
@@ -231,66 +612,10 @@ else:
         if 'route_destination' not in st.session_state:
             st.session_state.route_destination = ""
             
-        # Define callback to handle route calculation
-        def calculate_route(origin, destination):
-            if not origin or not destination:
-                st.error("Please enter both origin and destination addresses.")
-                return False
-                
-            # Get coordinates
-            lat1, lng1 = geocode_address(origin, GOOGLE_MAPS_API_KEY)
-            lat2, lng2 = geocode_address(destination, GOOGLE_MAPS_API_KEY)
-            
-            if not lat1 or not lat2:
-                st.error("Could not geocode one or both addresses. Please check them and try again.")
-                return False
-                
-            # Call Google Maps Directions API
-            directions_url = f"https://maps.googleapis.com/maps/api/directions/json?origin={lat1},{lng1}&destination={lat2},{lng2}&mode=driving&key={GOOGLE_MAPS_API_KEY}"
-            response = requests.get(directions_url)
-            data = response.json()
-            
-            if data["status"] != "OK":
-                st.error(f"Could not calculate route: {data['status']}")
-                return False
-                
-            # Process route data
-            route = data["routes"][0]
-            puntos = polyline.decode(route["overview_polyline"]["points"])
-            
-            # Calculate total distance and duration
-            distancia_total_m = 0
-            duracion_total_s = 0
-            for leg in route["legs"]:
-                distancia_total_m += leg["distance"]["value"]  # meters
-                duracion_total_s += leg["duration"]["value"]   # seconds
-                
-            # Convert to readable format
-            distancia_km = round(distancia_total_m / 1000, 2)
-            distancia_miles = round(distancia_km * 0.621371, 2)
-            
-            # Save to session state
-            st.session_state.has_route = True
-            st.session_state.route_distance_km = distancia_km
-            st.session_state.route_distance_miles = distancia_miles
-            st.session_state.route_origin = origin
-            st.session_state.route_destination = destination
-            st.session_state.route_points = puntos
-            st.session_state.route_origin_coords = [route["legs"][0]["start_location"]["lat"], route["legs"][0]["start_location"]["lng"]]
-            st.session_state.route_destination_coords = [route["legs"][0]["end_location"]["lat"], route["legs"][0]["end_location"]["lng"]]
-            
-            # Calculate human-readable duration
-            horas = duracion_total_s // 3600
-            minutos = (duracion_total_s % 3600) // 60
-            st.session_state.route_duration_text = f"{horas}h {minutos}min" if horas > 0 else f"{minutos}min"
-            
-            # Print debug info
-            print(f"\n==== ROUTE CALCULATED AND STORED ====")
-            print(f"Origin: {origin} -> Destination: {destination}")
-            print(f"Distance: {distancia_km} km / {distancia_miles} miles")
-            print(f"Session state vars: {list(st.session_state.keys())}")
-            
-            return True
+        # Route helpers are only needed on this page, so they are imported
+        # on first use
+        from app.route import calculate_route, warm_geocode_cache
+        warm_geocode_cache(GOOGLE_MAPS_API_KEY)
             
         # Section 1: Route input form - always visible
         with st.form(key="route_form"):
@@ -303,63 +628,71 @@ else:
                 destino = st.text_input("🏁 Destination Address", 
                                         value=st.session_state.get('route_destination', ''),
                                         placeholder="E.g., Central Park, New York")
+            use_directions = st.checkbox(
+                "Follow streets (Google Routes)",
+                value=True,
+                help="Uncheck to use the straight-line distance and skip the Routes API call"
+            )
             submit_button = st.form_submit_button(label="Calculate Route")
             
         # Process form submission
-        if submit_button:
-            calculate_route(origen, destino)
+        if submit_button and calculate_route(origen, destino, use_directions):
+            # Most trips have one passenger, so that prediction is requested
+            # right away and is usually back before the predict button is clicked.
+            # The worker adds the pickup time to this dict, so it is only read back
+            # for the comparison and that pickup time, never sent again
+            speculative_data = {
+                "passenger_count": 1,
+                "trip_distance": st.session_state.route_distance_miles
+            }
+            st.session_state.speculative_prediction = (
+                speculative_data,
+                submit_in_background(predict_fare_duration, token, speculative_data)
+            )
             
         # Section 2: Display map and route info if available
         if st.session_state.has_route:
-            # Create map centered on the route's midpoint
-            route_points = st.session_state.route_points
-            
-            # Calculate the bounds of the route
-            lats = [point[0] for point in route_points]
-            lngs = [point[1] for point in route_points]
-            
-            # Calculate center point
-            center_lat = (min(lats) + max(lats)) / 2
-            center_lng = (min(lngs) + max(lngs)) / 2
-            
-            # Adjust zoom based on route distance
-            if st.session_state.route_distance_km < 2:
-                zoom_level = 14
-            elif st.session_state.route_distance_km < 5:
-                zoom_level = 13
-            elif st.session_state.route_distance_km < 10:
-                zoom_level = 12
-            else:
-                zoom_level = 11
-            
-            # Create map with dynamic center and zoom
-            ruta_map = folium.Map(location=[center_lat, center_lng], zoom_start=zoom_level)
-            
-            # Add markers and route line
-            folium.Marker(
-                st.session_state.route_origin_coords, 
-                tooltip="Origin", 
-                icon=folium.Icon(color="green")
-            ).add_to(ruta_map)
-            
-            folium.Marker(
-                st.session_state.route_destination_coords, 
-                tooltip="Destination", 
-                icon=folium.Icon(color="red")
-            ).add_to(ruta_map)
-            
-            folium.PolyLine(
-                st.session_state.route_points, 
-                color="blue", 
-                weight=5, 
-                opacity=0.8
-            ).add_to(ruta_map)
-            
-            # Fit map to bounds of route
-            ruta_map.fit_bounds([[min(lats), min(lngs)], [max(lats), max(lngs)]])
+            # The predict form's callback runs before the rerun, so the request
+            # is sent now and runs while the map is built
+            prediction_fetch = None
+            if st.session_state.pop("route_prediction_requested", False):
+                prediction_data = {
+                    "passenger_count": st.session_state.get("route_passengers", 1),
+                    "trip_distance": st.session_state.route_distance_miles
+                }
+                
+                # Reuse the speculative request when it matches the inputs, its
+                # errors are never shown: a failed one is replaced by a fresh request
+                speculative_data, speculative_future = st.session_state.pop("speculative_prediction", (None, None))
+                if speculative_data is not None and all(
+                    speculative_data[field] == prediction_data[field] for field in prediction_data
+                ):
+                    prediction_fetch = submit_in_background(
+                        speculative_result, speculative_future, speculative_data, token, prediction_data
+                    ).result
+                else:
+                    prediction_fetch = submit_in_background(predict_fare_duration, token, prediction_data).result
+            
+            # The map HTML only changes with the route, so it is built once per
+            # route and reused while the passenger slider or buttons rerun the page
+            if "route_map_html" not in st.session_state:
+                # Calculate the bounds of the route, (lat, lng) minimums and
+                # maximums in one pass over the array
+                route_points = st.session_state.route_points
+                lo = route_points.min(axis=0)
+                hi = route_points.max(axis=0)
+                
+                st.session_state.route_map_html = route_map_html(
+                    st.session_state.route_origin_coords,
+                    st.session_state.route_destination_coords,
+                    # GeoJSON expects (lng, lat), flipping the columns of the
+                    # array builds the whole coordinates list in one pass
+                    route_points[:, ::-1].tolist(),
+                    [lo.tolist(), hi.tolist()]
+                )
             
-            # Display map
-            folium_static(ruta_map)
+            # Display map, the view is fitted to the bounds of the route
+            components.html(st.session_state.route_map_html, height=510, width=700)
             
             # Show route details
             route_info = f"""
@@ -371,82 +704,47 @@ else:
             
             # Section 3: Prediction controls - only shown when route is available
             st.subheader("Get fare and duration prediction")
-            passenger_count = st.select_slider(
-                "👥 Passenger Count",
-                options=[1, 2, 3, 4],
-                value=1
-            )
+            # Inside a form, moving the slider doesn't rerun the page
+            with st.form(key="route_predict_form"):
+                st.select_slider(
+                    "👥 Passenger Count",
+                    options=[1, 2, 3, 4],
+                    value=1,
+                    key="route_passengers"
+                )
+                predict_submitted = st.form_submit_button(
+                    "🔮 Predict Fare & Duration",
+                    on_click=request_route_prediction
+                )
             
-            if st.button("🔮 Predict Fare & Duration"):
-                # Create prediction request
-                prediction_data = {
-                    "passenger_count": passenger_count,
-                    "trip_distance": st.session_state.route_distance_miles
-                }
-                
-                response = predict_fare_duration(token, prediction_data)
-                
-                if response and response.status_code == 200:
-                    try:
-                        result = response.json()
-                        
-                        # Extract prediction values
-                        fare_amount = float(result.get('fare_amount', 0))
-                        trip_duration = float(result.get('trip_duration', 0))
-                        
-                        # Create prediction summary box with updated background color
-                        prediction_html = f"""
-                        <div style="padding:15px; border-radius:10px; background-color:#2E4053; color:white; margin:10px 0;">
-                            <h3 style="margin-top:0; color:white;">Prediction Results</h3>
-                            <p>For your <b>{st.session_state.route_distance_miles} mile</b> trip with <b>{passenger_count}</b> passenger(s):</p>
-                        </div>
-                        """
-                        st.markdown(prediction_html, unsafe_allow_html=True)
-                        
-                        # Display metrics
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric("💰 Estimated Fare", f"${fare_amount:.2f}")
-                        with col2:
-                            st.metric("⏱️ Estimated Duration", f"{trip_duration/60:.1f} min")
-                        
-                        # Store for feedback
-                        st.session_state.last_prediction = {
-                            'fare_amount': fare_amount,
-                            'trip_duration': trip_duration,
-                            'success': True
-                        }
-                        st.session_state.last_prediction_data = prediction_data
-                        st.session_state.last_prediction_type = "fare_duration"
-                        
-                    except Exception as e:
-                        st.error(f"Error processing prediction: {str(e)}")
-                else:
-                    st.error("Failed to get prediction. Please try again.")
+            if predict_submitted and prediction_fetch:
+                # Wait for the request started before the map was built
+                show_fare_duration_prediction(prediction_fetch, prediction_data)
         else:
             # Show empty map when no route is calculated
-            mapa_base = folium.Map(location=[ny_lat, ny_lng], zoom_start=12)
-            folium_static(mapa_base)
+            components.html(base_map_html(ny_lat, ny_lng, 12), height=510, width=700)
             
             st.info("Enter origin and destination addresses above and click 'Calculate Route' to get started.")
             
             # Allow manual distance input when no route is available
             st.subheader("Or make a prediction with manual distance input")
             
-            col1, col2 = st.columns(2)
-            with col1:
-                manual_distance = st.number_input("🛣️ Trip Distance (miles)", 
-                                               min_value=0.1, 
-                                               value=1.0, 
-                                               step=0.1)
-            with col2:
-                manual_passengers = st.select_slider(
-                    "👥 Passenger Count",
-                    options=[1, 2, 3, 4],
-                    value=1
-                )
+            with st.form(key="manual_predict_form"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    manual_distance = st.number_input("🛣️ Trip Distance (miles)", 
+                                                   min_value=0.1, 
+                                                   value=1.0, 
+                                                   step=0.1)
+                with col2:
+                    manual_passengers = st.select_slider(
+                        "👥 Passenger Count",
+                        options=[1, 2, 3, 4],
+                        value=1
+                    )
+                manual_submitted = st.form_submit_button("🔮 Predict with Manual Input")
                 
-            if st.button("🔮 Predict with Manual Input"):
+            if manual_submitted:
                 # Create prediction data
                 prediction_data = {
                     "passenger_count": manual_passengers,
@@ -454,73 +752,37 @@ else:
                 }
                 
                 # Call prediction API
-                response = predict_fare_duration(token, prediction_data)
-                
-                if response and response.status_code == 200:
-                    try:
-                        result = response.json()
-                        
-                        # Extract prediction values
-                        fare_amount = float(result.get('fare_amount', 0))
-                        trip_duration = float(result.get('trip_duration', 0))
-                        
-                        # Create prediction summary box with updated background color
-                        prediction_html = f"""
-                        <div style="padding:15px; border-radius:10px; background-color:#2E4053; color:white; margin:10px 0;">
-                            <h3 style="margin-top:0; color:white;">Prediction Results</h3>
-                            <p>For your <b>{manual_distance} mile</b> trip with <b>{manual_passengers}</b> passenger(s):</p>
-                        </div>
-                        """
-                        st.markdown(prediction_html, unsafe_allow_html=True)
-                        
-                        # Display metrics
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric("💰 Estimated Fare", f"${fare_amount:.2f}")
-                        with col2:
-                            st.metric("⏱️ Estimated Duration", f"{trip_duration/60:.1f} min")
-                        
-                        # Store for feedback
-                        st.session_state.last_prediction = {
-                            'fare_amount': fare_amount,
-                            'trip_duration': trip_duration,
-                            'success': True
-                        }
-                        st.session_state.last_prediction_data = prediction_data
-                        st.session_state.last_prediction_type = "fare_duration"
-                        
-                    except Exception as e:
-                        st.error(f"Error processing prediction: {str(e)}")
-                else:
-                    st.error("Failed to get prediction. Please try again.")
+                show_fare_duration_prediction(lambda: predict_fare_duration(token, prediction_data), prediction_data)
     
     elif page == "Demand Prediction":
         st.markdown("## Taxi Demand Prediction")
         
         # Input form for demand prediction
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            region_id = st.number_input("Region ID", min_value=1, max_value=100, value=1)
-        
-        with col2:
-            prediction_date = st.date_input("Date")
-            prediction_hour = st.time_input("Time")
+        with st.form(key="demand_form"):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                region_id = st.number_input("Region ID", min_value=1, max_value=100, value=1)
+            
+            with col2:
+                prediction_date = st.date_input("Date")
+                prediction_hour = st.time_input("Time")
+            
+            # Submit button
+            demand_submitted = st.form_submit_button("Predict Demand")
         
         # Combine date and time
         date_hour_str = f"{prediction_date} {prediction_hour}"
         
-        # Submit button
-        if st.button("Predict Demand"):
+        if demand_submitted:
             prediction_data = {
                 "region_id": region_id,
                 "date_hour": date_hour_str
             }
             
-            response = predict_demand(token, prediction_data)
+            result = predict_demand(token, prediction_data)
             
-            if response and response.status_code == 200:
-                result = response.json()
+            if result is not None:
                 st.session_state.last_prediction = result
                 st.session_state.last_prediction_data = prediction_data
                 st.session_state.last_prediction_type = "demand"
@@ -537,11 +799,6 @@ else:
                 # TODO: Display heat map of demand across regions
                 st.subheader("Demand Heatmap")
                 st.info("Heatmap visualization will be implemented here.")
-            else:
-                if response:
-                    st.error(f"Prediction failed: {response.text}")
-                else:
-                    st.error("Prediction failed. Please try again.")
     
     # Feedback section (shown after a prediction)
     if "last_prediction" in st.session_state:
@@ -553,88 +810,22 @@ else:
         # Display rating instructions with styling that matches the prediction results
         st.markdown("""
         <h3 style='margin-bottom: 15px; color: #FFDD00;'>How would you rate this prediction?</h3>
-        <p style='color: #e0e0e0; margin-bottom: 20px;'>Click a star to rate (1-5)</p>
+        <p style='color: #e0e0e0; margin-bottom: 20px;'>Pick a rating (1-5)</p>
         """, unsafe_allow_html=True)
         
-        # Create columns for star buttons with equal spacing
-        col1, col2, col3, col4, col5 = st.columns(5)
-        
-        # Individual star buttons with different help text and larger font
-        button_style = """
-        <style>
-        div[data-testid="stButton"] button {
-            font-size: 32px;
-            padding: 5px 15px;
-            background-color: #34495E;
-            color: #FFDD00;
-            border: none;
-            transition: transform 0.2s, background-color 0.2s;
-        }
-        div[data-testid="stButton"] button:hover {
-            transform: scale(1.1);
-            background-color: #2C3E50;
-        }
-        </style>
-        """
-        st.markdown(button_style, unsafe_allow_html=True)
-        
-        with col1:
-            star1 = st.button("⭐", key="star1", help="Rate 1 - Poor")
-        with col2:
-            star2 = st.button("⭐", key="star2", help="Rate 2 - Fair")
-        with col3:
-            star3 = st.button("⭐", key="star3", help="Rate 3 - Good")
-        with col4:
-            star4 = st.button("⭐", key="star4", help="Rate 4 - Very Good")
-        with col5:
-            star5 = st.button("⭐", key="star5", help="Rate 5 - Excellent")
-        
-        # Determine rating based on which star button was clicked
-        if star1:
-            st.session_state.feedback_rating = 1
-        elif star2:
-            st.session_state.feedback_rating = 2
-        elif star3:
-            st.session_state.feedback_rating = 3
-        elif star4:
-            st.session_state.feedback_rating = 4
-        elif star5:
-            st.session_state.feedback_rating = 5
+        # A single widget for the rating, it starts at 3 like the API's default
+        st.radio(
+            "Rating",
+            options=list(RATING_DESCRIPTIONS),
+            index=2,
+            horizontal=True,
+            format_func=lambda rating: "⭐" * rating,
+            key="feedback_rating",
+            label_visibility="collapsed"
+        )
         
         # Show the current rating with a visual representation
-        if 'feedback_rating' in st.session_state:
-            rating = st.session_state.feedback_rating
-            
-            # Rating descriptions
-            rating_descriptions = {
-                1: "Poor",
-                2: "Fair",
-                3: "Good", 
-                4: "Very Good",
-                5: "Excellent"
-            }
-            
-            # Create a visually appealing rating display
-            filled_stars = "⭐" * rating
-            empty_stars = "☆" * (5 - rating)
-            
-            # Use colors that match the dark theme of prediction results
-            accent_colors = {
-                1: "#FF5252",  # red accent
-                2: "#FF9800",  # orange accent
-                3: "#FFEB3B",  # yellow accent
-                4: "#4CAF50",  # green accent
-                5: "#00BCD4"   # blue accent
-            }
-            
-            rating_display = f"""
-            <div style="background-color: #2E4053; padding: 20px; border-radius: 10px; text-align: center; margin: 25px 0; box-shadow: 0 4px 8px rgba(0,0,0,0.3);">
-                <div style="font-size: 18px; margin-bottom: 8px; color: white;">You rated this prediction: <strong style="color: {accent_colors[rating]};">{rating}/5</strong></div>
-                <div style="font-size: 30px; margin: 15px 0; color: {accent_colors[rating]};">{filled_stars}{empty_stars}</div>
-                <div style="font-style: italic; margin-top: 8px; color: {accent_colors[rating]};">{rating_descriptions[rating]}</div>
-            </div>
-            """
-            st.markdown(rating_display, unsafe_allow_html=True)
+        st.markdown(RATING_HTML[st.session_state.feedback_rating], unsafe_allow_html=True)
         
         # Add some spacing before the comments section
         st.markdown("<div style='height: 15px'></div>", unsafe_allow_html=True)
@@ -645,7 +836,7 @@ else:
         <p style='font-style: italic; color: #e0e0e0; margin-bottom: 15px;'>Share your thoughts about the prediction</p>
         """, unsafe_allow_html=True)
         
-        comment = st.text_area(
+        st.text_area(
             "",
             key="feedback_comment",
             height=100,
@@ -653,35 +844,14 @@ else:
         )
         
         # Send feedback button with more prominent styling
-        send_button = st.button("Submit Feedback", type="primary")
-        if send_button:
-            if 'feedback_rating' in st.session_state:
-                with st.spinner("Sending feedback..."):
-                    response = send_feedback(
-                        token=token,
-                        rating=st.session_state.feedback_rating,
-                        comment=comment,
-                        prediction_type=st.session_state.last_prediction_type,
-                        prediction_data=st.session_state.last_prediction_data
-                    )
-                
-                if response and response.status_code in (200, 201):
-                    st.success("Thanks for your feedback! Your input helps us improve our predictions.")
-                    # Clear the rating after submission
-                    if 'feedback_rating' in st.session_state:
-                        del st.session_state.feedback_rating
-                else:
-                    if response:
-                        st.error(f"Error sending feedback: {response.text}")
-                    else:
-                        st.error("Error sending feedback. Please try again.")
-            else:
-                st.warning("Please select a star rating before submitting your feedback.")
+        st.button("Submit Feedback", type="primary", on_click=submit_feedback, args=(token,))
+        if st.session_state.pop("feedback_sent", False):
+            st.success("Thanks for your feedback! Your input helps us improve our predictions.")
     
     # Logout button
     if st.sidebar.button("Logout"):
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
+        st.session_state.clear()
+        st.session_state.logged_out = True
         st.experimental_rerun()
 
     # In the sidebar section, after the page selection and before the logout button
@@ -698,20 +868,30 @@ else:
                 "trip_distance": sidebar_distance
             }
             
-            test_response = predict_fare_duration(token, test_data)
-            if test_response and test_response.status_code == 200:
-                test_result = test_response.json()
+            try:
+                test_result = predict_fare_duration(token, test_data)
+            except PREDICTION_ERRORS as e:
+                st.sidebar.error(f"API Test Failed: {prediction_error(e)}")
+            else:
                 st.sidebar.json(test_result)
                 st.sidebar.success(f"Raw API Test Result: fare=${test_result.get('fare_amount', 0):.2f}, duration={test_result.get('trip_duration', 0)/60:.1f}min")
+
+    if st.sidebar.checkbox("Show Performance"):
+        with st.sidebar.expander("Performance", expanded=True):
+            latencies = pd.DataFrame(list(LATENCIES), columns=["function", "ms"])
+            if latencies.empty:
+                st.write("No API calls recorded yet.")
             else:
-                if test_response:
-                    st.sidebar.error(f"API Test Failed: {test_response.status_code} - {test_response.text}")
-                else:
-                    st.sidebar.error("API Test Failed")
+                st.dataframe(latencies.groupby("function")["ms"].describe()[["count", "mean", "50%", "max"]])
+                st.dataframe(latencies.tail(50))
+            
+            # st.cache_data has no public hit statistics in this Streamlit
+            # version, the in-process lru cache does
+            cache_info = [("auth_headers", auth_headers.cache_info())]
+            st.dataframe(pd.DataFrame(
+                [(name, info.hits, info.misses, info.currsize) for name, info in cache_info],
+                columns=["cache", "hits", "misses", "size"]
+            ))
 
 # Footer
-st.markdown("<hr style='border:2px solid #FFDD00;'>", unsafe_allow_html=True)
-st.markdown(
-    "<p style='text-align: center; color: #FFDD00;'>NYC Taxi Prediction System</p>",
-    unsafe_allow_html=True,
-) 
\ No newline at end of file
+st.markdown(FOOTER_HTML, unsafe_allow_html=True) 
\ No newline at end of file